@@ -1,48 +1,419 @@
 import streamlit as st
-from groq import Groq
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from utils.text_splitter import split_text
+from config.app_config import (
+    HNSW_MIN_CHUNKS,
+    HNSW_EF_SEARCH,
+    IVFPQ_MIN_CHUNKS,
+    IVFPQ_NPROBE,
+    CHAT_HISTORY_TOKEN_BUDGET,
+    CONTEXTUALIZE_TOKEN_BUDGET,
+    RETRIEVED_CONTEXT_TOKEN_BUDGET,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_MB,
+    EMBEDDING_CACHE_MAX_AGE_DAYS,
+    VECTOR_STORE_CACHE_DIR,
+    VECTOR_STORE_CACHE_MAX_MB,
+    VECTOR_STORE_CACHE_MAX_AGE_DAYS,
+)
+from utils.disk_cache import prune_cache_dir, touch
+import numpy as np
+import hashlib
+import tempfile
+import re
 import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Follow-ups without these words are already standalone and skip the rewrite
+_PRONOUN_RE = re.compile(
+    r"\b(it|its|they|them|that|those|this|these|he|she|above|previous|earlier)\b",
+    re.I,
+)
+
+
+def _count_tokens(text):
+    """Cheaply estimate Llama prompt tokens (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _trim_history(chat_history, token_budget):
+    """Keep the most recent non-system messages that fit within the token budget."""
+    recent = []
+    used = 0
+    for msg in reversed(chat_history):
+        # System messages hold the __REPORT_TEXT__ envelope, never chat turns
+        if msg["role"] == "system":
+            continue
+        cost = _count_tokens(msg["content"])
+        if used + cost > token_budget:
+            # Keep the head of the overflowing message (usually the report
+            # analysis) rather than dropping it entirely
+            remaining_chars = (token_budget - used) * 4
+            if remaining_chars > 0:
+                recent.append({**msg, "content": msg["content"][:remaining_chars]})
+            break
+        used += cost
+        recent.append(msg)
+    recent.reverse()
+    return recent
+
+
+def _save_vector(cache_dir, digest, vector):
+    """Write a cached vector atomically so readers never see a partial file."""
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            dir=cache_dir, prefix=".", suffix=".tmp", delete=False
+        ) as tmp:
+            tmp_path = tmp.name
+            np.save(tmp, vector)
+        os.replace(tmp_path, os.path.join(cache_dir, f"{digest}.npy"))
+    except OSError:
+        # Caching is best effort; just don't leave the partial file behind
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+class SimpleStore:
+    """Minimal vector store: a FAISS index plus the chunk texts it indexes."""
+
+    def __init__(self, index, texts):
+        import faiss
+        from utils.similarity import SMALL_CORPUS_SIZE
+
+        self.index = index
+        self.texts = texts
+        # Tiny reports are scored directly rather than through FAISS
+        self.vectors = None
+        if index.ntotal <= SMALL_CORPUS_SIZE and isinstance(index, faiss.IndexFlat):
+            self.vectors = index.reconstruct_n(0, index.ntotal)
+
+    def search(self, query_vector, k):
+        """Return the texts of the k chunks most similar to query_vector."""
+        if self.vectors is not None:
+            from utils.similarity import top_k_cosine
+
+            _, rows = top_k_cosine(query_vector, self.vectors, k)
+            return [self.texts[i] for i in rows]
+
+        query = np.asarray(query_vector, dtype="float32").reshape(1, -1)
+        _, ids = self.index.search(query, min(k, self.index.ntotal))
+        return [self.texts[i] for i in ids[0] if i >= 0]
+
+
+@st.cache_resource(show_spinner=False)
+def _get_embeddings():
+    """Load the embedding model once and share it across sessions."""
+    # Prefer the int8 ONNX Runtime export; fall back to the PyTorch model
+    # when it cannot be installed, exported, or loaded.
+    try:
+        from agents.onnx_embeddings import OnnxMiniLMEmbeddings
+
+        return OnnxMiniLMEmbeddings(batch_size=64)
+    except Exception as e:
+        logger.warning(f"ONNX embeddings unavailable, using HuggingFace: {str(e)}")
+
+    # Deferred so torch is only loaded when the ONNX path is unavailable
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name="all-MiniLM-L6-v2",
+        encode_kwargs={"normalize_embeddings": True, "batch_size": 64},
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def _get_groq_client():
+    """Create a single Groq client shared across sessions."""
+    import httpx
+    from groq import Groq
+
+    # Keep TLS connections alive across chat turns and multiplex over HTTP/2
+    http_client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=16, max_connections=32),
+        timeout=30,
+    )
+    return Groq(api_key=st.secrets["GROQ_API_KEY"], http_client=http_client)
 
 
 class ChatAgent:
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200
-        )
-        self.client = Groq(api_key=st.secrets["GROQ_API_KEY"])
+        self.embeddings = _get_embeddings()
+        self.chunk_size = 1000
+        self.chunk_overlap = 200
+        self.chunk_tokens = 254  # Leaves room for [CLS]/[SEP] in 256
+        self.chunk_overlap_tokens = 64
+        self.client = _get_groq_client()
         self.model_name = "llama-3.3-70b-versatile"
 
-    def initialize_vector_store(self, text_content):
+    def _encode_texts(self, texts):
+        """Batch-encode texts straight into a normalized float32 matrix."""
+        # Call the underlying encoder directly to skip the per-vector
+        # list round-trip of embed_documents.
+        client = getattr(self.embeddings, "client", None)
+        if client is not None and hasattr(client, "encode"):
+            vectors = client.encode(
+                texts,
+                batch_size=64,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        elif hasattr(self.embeddings, "encode"):
+            vectors = self.embeddings.encode(texts)
+        else:
+            vectors = self.embeddings.embed_documents(texts)
+        return np.asarray(vectors, dtype="float32")
+
+    def _get_tokenizer(self):
+        """Return the embedding model's own tokenizer, if it exposes one."""
+        tokenizer = getattr(self.embeddings, "tokenizer", None)
+        if tokenizer is None:
+            tokenizer = getattr(getattr(self.embeddings, "client", None), "tokenizer", None)
+        return tokenizer
+
+    def _split_tokens(self, text_content, tokenizer):
+        """Tokenize once and cut overlapping token windows with their source text."""
+        encoding = tokenizer(
+            text_content,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            verbose=False,
+        )
+        ids = encoding["input_ids"]
+        offsets = encoding["offset_mapping"]
+        step = self.chunk_tokens - self.chunk_overlap_tokens
+
+        texts, windows = [], []
+        for start in range(0, len(ids), step):
+            window = ids[start : start + self.chunk_tokens]
+            # Slice the original text so the LLM sees the report verbatim
+            texts.append(
+                text_content[offsets[start][0] : offsets[start + len(window) - 1][1]]
+            )
+            windows.append(window)
+            if start + self.chunk_tokens >= len(ids):
+                break
+        return texts, windows
+
+    def _encode_tokens(self, tokens):
+        """Run the embedding model on already-tokenized, padded inputs."""
+        if hasattr(self.embeddings, "encode_tokens"):
+            return self.embeddings.encode_tokens(tokens)
+
+        import torch
+
+        client = self.embeddings.client
+        features = {
+            name: torch.from_numpy(array).to(client.device)
+            for name, array in tokens.items()
+        }
+        with torch.no_grad():
+            vectors = client.forward(features)["sentence_embedding"].cpu().numpy()
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def _encode_token_windows(self, windows):
+        """Batch-encode token windows without running the tokenizer again."""
+        tokenizer = self._get_tokenizer()
+        batches = []
+        for start in range(0, len(windows), 64):
+            batch = [
+                tokenizer.build_inputs_with_special_tokens(window)
+                for window in windows[start : start + 64]
+            ]
+            width = max(len(ids) for ids in batch)
+            input_ids = np.full((len(batch), width), tokenizer.pad_token_id, dtype="int64")
+            attention_mask = np.zeros_like(input_ids)
+            for row, ids in enumerate(batch):
+                input_ids[row, : len(ids)] = ids
+                attention_mask[row, : len(ids)] = 1
+            batches.append(
+                self._encode_tokens(
+                    {
+                        "input_ids": input_ids,
+                        "attention_mask": attention_mask,
+                        "token_type_ids": np.zeros_like(input_ids),
+                    }
+                )
+            )
+        return np.vstack(batches).astype("float32")
+
+    def _embed_chunks(self, texts, windows=None):
+        """Embed chunks, reusing vectors cached on disk by SHA-256 of the text."""
+        cache_dir = os.path.join(
+            os.path.expanduser(EMBEDDING_CACHE_DIR), type(self.embeddings).__name__
+        )
+        hashes = [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+        vectors = [None] * len(texts)
+
+        for i, digest in enumerate(hashes):
+            path = os.path.join(cache_dir, f"{digest}.npy")
+            try:
+                vector = np.load(path)
+            except FileNotFoundError:
+                continue
+            except Exception:
+                # Truncated or corrupt entry: drop it so it is re-encoded
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            vectors[i] = vector
+            touch(path)
+
+        misses = [i for i, vector in enumerate(vectors) if vector is None]
+        if misses:
+            if windows is not None:
+                encoded = self._encode_token_windows([windows[i] for i in misses])
+            else:
+                encoded = self._encode_texts([texts[i] for i in misses])
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+            except OSError:
+                cache_dir = None
+            for i, vector in zip(misses, encoded):
+                vectors[i] = vector
+                if cache_dir:
+                    _save_vector(cache_dir, hashes[i], vector)
+            if cache_dir:
+                prune_cache_dir(
+                    cache_dir,
+                    EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+                    EMBEDDING_CACHE_MAX_AGE_DAYS * 86400,
+                )
+
+        return np.vstack(vectors).astype("float32")
+
+    def _build_index(self, vectors):
+        """Build a cosine (inner-product) index sized to the number of chunks."""
+        import faiss
+
+        dimension = vectors.shape[1]
+        if len(vectors) > IVFPQ_MIN_CHUNKS:
+            # Compress very long reports to 48-byte PQ codes to cut memory traffic
+            quantizer = faiss.IndexFlatIP(dimension)
+            index = faiss.IndexIVFPQ(
+                quantizer, dimension, 64, 48, 8, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vectors)
+        elif len(vectors) > HNSW_MIN_CHUNKS:
+            # Graph search keeps long reports fast at negligible recall loss
+            index = faiss.IndexHNSWFlat(dimension, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 40
+        else:
+            index = faiss.IndexFlatIP(dimension)
+        index.add(vectors)
+        return index
+
+    def _index_path(self, cache_key, texts):
+        """Path of the persisted index for this exact embedder and chunking."""
+        # The chunk texts pin the chunking parameters, so a saved index is only
+        # reused when its rows line up with the chunks being served
+        digest = hashlib.sha1(cache_key.encode())
+        digest.update(type(self.embeddings).__name__.encode())
+        for text in texts:
+            digest.update(b"\0")
+            digest.update(text.encode())
+        return os.path.join(
+            os.path.expanduser(VECTOR_STORE_CACHE_DIR), f"{digest.hexdigest()}.faiss"
+        )
+
+    def _load_index(self, cache_key, texts):
+        """Load a persisted FAISS index for these chunks, if one exists."""
+        import faiss
+
+        if not cache_key:
+            return None
+        path = self._index_path(cache_key, texts)
+        try:
+            index = faiss.read_index(path)
+        except Exception:
+            return None
+        if index.ntotal != len(texts):
+            return None
+        touch(path)
+        return index
+
+    def _save_index(self, index, cache_key, texts):
+        """Persist a FAISS index so other sessions can skip rebuilding it."""
+        import faiss
+
+        if not cache_key:
+            return
+        cache_dir = os.path.expanduser(VECTOR_STORE_CACHE_DIR)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            faiss.write_index(index, self._index_path(cache_key, texts))
+        except Exception:
+            return  # Persistence is best effort
+        prune_cache_dir(
+            cache_dir,
+            VECTOR_STORE_CACHE_MAX_MB * 1024 * 1024,
+            VECTOR_STORE_CACHE_MAX_AGE_DAYS * 86400,
+        )
+
+    def initialize_vector_store(self, text_content, cache_key=None):
         """Create vector store from text content."""
+        import faiss
+
         if not text_content or text_content.strip() == "":
             # Create a minimal vector store with a placeholder
             text_content = "No report context available."
 
-        texts = self.text_splitter.split_text(text_content)
+        # Chunk on token boundaries when the model's tokenizer is available so
+        # the same token ids feed the encoder; otherwise split on sentences
+        windows = None
+        tokenizer = self._get_tokenizer()
+        if tokenizer is not None:
+            texts, windows = self._split_tokens(text_content, tokenizer)
+        else:
+            texts = split_text(text_content, self.chunk_size, self.chunk_overlap)
         if not texts:
             # If splitting results in empty list, add at least one text
             texts = [text_content]
+            windows = None
+
+        # MiniLM is trained for cosine similarity; the embeddings come back
+        # normalized, so an inner-product index ranks by cosine directly.
+        index = self._load_index(cache_key, texts)
+        if index is None:
+            vectors = self._embed_chunks(texts, windows)
+            index = self._build_index(vectors)
+            self._save_index(index, cache_key, texts)
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = st.session_state.get("hnsw_ef_search", HNSW_EF_SEARCH)
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = IVFPQ_NPROBE
 
-        vectorstore = FAISS.from_texts(texts, self.embeddings)
-        return vectorstore
+        return SimpleStore(index, texts)
 
     def _format_chat_history(self, chat_history):
-        """Format chat history for Groq API."""
-        messages = []
-        for msg in chat_history:
-            messages.append({"role": msg["role"], "content": msg["content"]})
-        return messages
+        """Format the recent chat window for Groq API."""
+        return [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in _trim_history(chat_history, CHAT_HISTORY_TOKEN_BUDGET)
+        ]
+
+    def is_follow_up(self, query):
+        """Whether the query refers back to earlier turns ("is that normal?")."""
+        return bool(_PRONOUN_RE.search(query))
 
     def _contextualize_query(self, query, chat_history):
         """Reformulate query considering chat history."""
-        if not chat_history:
+        if not chat_history or not self.is_follow_up(query):
             return query
 
         # Build context from recent chat history
-        recent_history = chat_history[-4:]  # Last 2 exchanges
+        recent_history = _trim_history(chat_history, CONTEXTUALIZE_TOKEN_BUDGET)
+        if not recent_history:
+            return query
         history_text = "\n".join(
             [
                 f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
@@ -76,19 +447,25 @@ Standalone Question:"""
         except Exception:
             return query  # Fallback to original query
 
-    def get_response(self, query, vectorstore, chat_history=None):
-        """Get response using RAG."""
+    def get_response(self, query, vectorstore, chat_history=None, query_embedding=None):
+        """Get response using RAG, yielding the answer as it streams in.
+
+        ``query_embedding`` may be passed when the caller has already
+        embedded ``query`` so retrieval does not encode it again.
+        """
         if chat_history is None:
             chat_history = []
 
-        # 1. Contextualize query based on chat history
+        # 1. Contextualize query based on chat history (only follow-ups that
+        # refer back to earlier turns are rewritten)
         contextualized_query = self._contextualize_query(query, chat_history)
 
         # 2. Retrieve relevant documents
         try:
-            retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-            docs = retriever.get_relevant_documents(contextualized_query)
-            context = "\n\n".join([doc.page_content for doc in docs])
+            if query_embedding is None or contextualized_query.strip() != query.strip():
+                query_embedding = self.embeddings.embed_query(contextualized_query)
+            context = "\n\n".join(vectorstore.search(query_embedding, 3))
+            context = context[: RETRIEVED_CONTEXT_TOKEN_BUDGET * 4]
 
             # If context is just placeholder text, set to empty
             if context.strip() == "No report context available.":
@@ -110,9 +487,7 @@ Standalone Question:"""
 
         # Add chat history
         if chat_history:
-            formatted_history = self._format_chat_history(
-                chat_history[-6:]
-            )  # Last 3 exchanges
+            formatted_history = self._format_chat_history(chat_history)
             messages.extend(formatted_history)
 
         # Add context and current query
@@ -127,14 +502,16 @@ Standalone Question:"""
             user_message = f"Question: {query}\n\nNote: No report context is available. Please answer based on the chat history."
         messages.append({"role": "user", "content": user_message})
 
-        # 4. Get response from Groq
+        # 4. Stream response from Groq so the UI can render tokens as they arrive
         try:
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
                 temperature=0.7,
                 max_tokens=500,
+                stream=True,
             )
-            return response.choices[0].message.content
+            for chunk in stream:
+                yield chunk.choices[0].delta.content or ""
         except Exception as e:
-            return f"Error generating response: {str(e)}"
+            yield f"Error generating response: {str(e)}"
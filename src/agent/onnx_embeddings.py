@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config.app_config import ONNX_CACHE_DIR
+
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+QUANTIZED_FILE = "model_int8.onnx"
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """
+    MiniLM sentence embeddings served by ONNX Runtime with int8 weights.
+    Produces the same mean-pooled, L2-normalized vectors as the
+    sentence-transformers model at a fraction of the CPU cost.
+    """
+
+    def __init__(self, batch_size=64, max_length=256, cache_dir=ONNX_CACHE_DIR):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        cache_dir = os.path.expanduser(cache_dir)
+
+        if not os.path.exists(os.path.join(cache_dir, QUANTIZED_FILE)):
+            self._export_quantized(cache_dir)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(cache_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            cache_dir, file_name=QUANTIZED_FILE, provider="CPUExecutionProvider"
+        )
+
+    @staticmethod
+    def _export_quantized(cache_dir):
+        """Export MiniLM to ONNX and dynamically quantize its weights to int8."""
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        from transformers import AutoTokenizer
+
+        # Build in a sibling temp dir and swap it in whole, so an interrupted
+        # export never leaves a half-written model at cache_dir
+        parent = os.path.dirname(cache_dir)
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=parent)
+        try:
+            model = ORTModelForFeatureExtraction.from_pretrained(MODEL_ID, export=True)
+            model.save_pretrained(tmp_dir)
+            AutoTokenizer.from_pretrained(MODEL_ID).save_pretrained(tmp_dir)
+            quantize_dynamic(
+                os.path.join(tmp_dir, "model.onnx"),
+                os.path.join(tmp_dir, QUANTIZED_FILE),
+                weight_type=QuantType.QInt8,
+            )
+            if os.path.isdir(cache_dir):
+                shutil.rmtree(cache_dir)  # Leftover from an older, partial export
+            os.replace(tmp_dir, cache_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def encode_tokens(self, tokens):
+        """Run the model on tokenized inputs and return mean-pooled unit vectors."""
+        hidden = self.model(**tokens).last_hidden_state
+
+        # Mean-pool over real tokens only
+        mask = tokens["attention_mask"][..., None].astype("float32")
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype("float32")
+
+    def encode(self, texts):
+        """Encode texts in batches into normalized float32 vectors."""
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            tokens = self.tokenizer(
+                texts[start : start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            batches.append(self.encode_tokens(dict(tokens)))
+        return np.vstack(batches) if batches else np.zeros((0, 384), dtype="float32")
+
+    def embed_documents(self, texts):
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
@@ -12,3 +12,25 @@ ANALYSIS_DAILY_LIMIT = 15
 # UI Settings
 PRIMARY_COLOR = "#64B5F6"
 SECONDARY_COLOR = "#1976D2"
+
+# Chat settings
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_TTL_SECONDS = 300
+SEMANTIC_CACHE_MAX_ENTRIES = 500
+VECTOR_STORE_CACHE_SIZE = 4
+HNSW_MIN_CHUNKS = 500  # Switch from exact to HNSW search above this size
+HNSW_EF_SEARCH = 32  # Override per session via st.session_state.hnsw_ef_search
+CHAT_HISTORY_TOKEN_BUDGET = 2000
+CONTEXTUALIZE_TOKEN_BUDGET = 1000
+RETRIEVED_CONTEXT_TOKEN_BUDGET = 1500
+IVFPQ_MIN_CHUNKS = 2000  # Product-quantize the index above this size
+IVFPQ_NPROBE = 8
+
+# On-disk caches (derived from user reports; bounded and expired)
+ONNX_CACHE_DIR = "~/.cache/hia/onnx/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = "~/.cache/hia/embeddings"
+EMBEDDING_CACHE_MAX_MB = 100
+EMBEDDING_CACHE_MAX_AGE_DAYS = 7
+VECTOR_STORE_CACHE_DIR = "~/.cache/hia/vector_stores"
+VECTOR_STORE_CACHE_MAX_MB = 200
+VECTOR_STORE_CACHE_MAX_AGE_DAYS = 7
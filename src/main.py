@@ -1,3 +1,4 @@
+import re
 import streamlit as st
 from auth.session_manager import SessionManager
 from components.auth_pages import show_login_page
@@ -5,7 +6,9 @@ from components.sidebar import show_sidebar
 from components.analysis_form import show_analysis_form
 from components.footer import show_footer
 from config.app_config import APP_NAME, APP_TAGLINE, APP_DESCRIPTION, APP_ICON
-from services.ai_service import get_chat_response
+from services.ai_service import get_chat_response, prewarm_chat_agent
+
+_REPORT_TEXT_RE = re.compile(r"__REPORT_TEXT__\n(.*?)\n__END_REPORT_TEXT__", re.S)
 
 # Must be the first Streamlit command
 st.set_page_config(
@@ -61,9 +64,20 @@ def show_chat_history():
     )
 
     if success:
+        # Extract the stored report text once per session rather than per turn
+        session_id = st.session_state.current_session["id"]
+        parse_report = st.session_state.get("report_text_session_id") != session_id
+        if parse_report:
+            st.session_state.current_report_text = ""
+            st.session_state.report_text_session_id = session_id
+
         for msg in messages:
             # Skip system messages (they contain report text metadata)
             if msg.get("role") == "system":
+                if parse_report:
+                    match = _REPORT_TEXT_RE.search(msg.get("content", ""))
+                    if match:
+                        st.session_state.current_report_text = match.group(1)
                 continue
             if msg["role"] == "user":
                 st.info(msg["content"])
@@ -83,32 +97,14 @@ def handle_chat_input(messages):
             st.session_state.current_session["id"], prompt, role="user"
         )
 
-        # Get context (report text)
-        # We try to get it from session state first (for immediate use)
+        # Report text is parsed from the stored system message on session load
         context_text = st.session_state.get("current_report_text", "")
 
-        # If not in session state, try to retrieve from stored system message
-        if not context_text and messages:
-            for msg in messages:
-                if msg.get("role") == "system" and "__REPORT_TEXT__" in msg.get(
-                    "content", ""
-                ):
-                    # Extract report text from system message
-                    content = msg.get("content", "")
-                    start_idx = content.find("__REPORT_TEXT__\n") + len(
-                        "__REPORT_TEXT__\n"
-                    )
-                    end_idx = content.find("\n__END_REPORT_TEXT__")
-                    if start_idx > len("__REPORT_TEXT__\n") - 1 and end_idx > start_idx:
-                        context_text = content[start_idx:end_idx]
-                        # Also restore to session state for future use
-                        st.session_state.current_report_text = context_text
-                        break
-
         with st.spinner("Thinking..."):
-            response = get_chat_response(prompt, context_text, messages)
-
-            st.success(response)
+            # Render tokens as they stream in; returns the full text
+            response = st.write_stream(
+                get_chat_response(prompt, context_text, messages)
+            )
 
             # Save AI response
             st.session_state.auth_service.save_chat_message(
@@ -164,6 +160,8 @@ def main():
             with st.expander("New Analysis / Update Report", expanded=False):
                 show_analysis_form()
 
+            # Load the chat models while the user reads the analysis or types
+            prewarm_chat_agent()
             handle_chat_input(messages)
         else:
             show_analysis_form()
@@ -1,41 +1,95 @@
+import hashlib
+import threading
+from collections import OrderedDict
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from agents.analysis_agent import AnalysisAgent
+from config.app_config import (
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    VECTOR_STORE_CACHE_SIZE,
+)
 # from agents.chat_agent import ChatAgent
 
+# Only guards creation of the per-session locks below
+_session_lock_guard = threading.Lock()
+
+
+def _get_session_init_lock():
+    """Return this session's init lock, so other users never wait on it."""
+    with _session_lock_guard:
+        if "init_lock" not in st.session_state:
+            st.session_state.init_lock = threading.Lock()
+        return st.session_state.init_lock
+
 
 def init_analysis_state():
     """Initialize analysis-related session state variables."""
-    if "analysis_agent" not in st.session_state:
-        st.session_state.analysis_agent = AnalysisAgent()
+    # Guard against the prewarm thread and a script run initializing at once
+    with _get_session_init_lock():
+        if "analysis_agent" not in st.session_state:
+            st.session_state.analysis_agent = AnalysisAgent()
 
-    if "chat_agent" not in st.session_state:
-        try:
-            from agents.chat_agent import ChatAgent
 
-            # Check if GROQ_API_KEY exists before initializing
-            if "GROQ_API_KEY" not in st.secrets:
+def init_chat_state():
+    """Initialize the chat agent; only sessions that reach the chat pay for it."""
+    with _get_session_init_lock():
+        if "chat_agent" not in st.session_state:
+            try:
+                from agents.chat_agent import ChatAgent
+
+                # Check if GROQ_API_KEY exists before initializing
+                if "GROQ_API_KEY" not in st.secrets:
+                    st.session_state.chat_agent = None
+                    st.session_state.chat_agent_error = "GROQ_API_KEY not found in secrets. Please add it to .streamlit/secrets.toml"
+                else:
+                    st.session_state.chat_agent = ChatAgent()
+                    st.session_state.chat_agent_error = None
+            except KeyError as e:
+                # Missing secret key
                 st.session_state.chat_agent = None
-                st.session_state.chat_agent_error = "GROQ_API_KEY not found in secrets. Please add it to .streamlit/secrets.toml"
-            else:
-                st.session_state.chat_agent = ChatAgent()
-                st.session_state.chat_agent_error = None
-        except KeyError as e:
-            # Missing secret key
-            st.session_state.chat_agent = None
-            st.session_state.chat_agent_error = f"Missing configuration: {str(e)}. Please check your .streamlit/secrets.toml file."
-        except ImportError as e:
-            # Import error (missing dependencies)
-            st.session_state.chat_agent = None
-            st.session_state.chat_agent_error = (
-                f"Missing dependencies: {str(e)}. Please install required packages."
-            )
-        except Exception as e:
-            # Other initialization errors
-            st.session_state.chat_agent = None
-            import traceback
+                st.session_state.chat_agent_error = f"Missing configuration: {str(e)}. Please check your .streamlit/secrets.toml file."
+            except ImportError as e:
+                # Import error (missing dependencies)
+                st.session_state.chat_agent = None
+                st.session_state.chat_agent_error = (
+                    f"Missing dependencies: {str(e)}. Please install required packages."
+                )
+            except Exception as e:
+                # Other initialization errors
+                st.session_state.chat_agent = None
+                import traceback
+
+                error_details = traceback.format_exc()
+                st.session_state.chat_agent_error = f"Failed to initialize chat agent: {str(e)}\n\nDetails: {error_details[:500]}"
+
+
+def prewarm_chat_agent():
+    """Build the chat agent and load its models on a background thread."""
+    if st.session_state.get("chat_agent_prewarm_started"):
+        return
+    st.session_state.chat_agent_prewarm_started = True
 
-            error_details = traceback.format_exc()
-            st.session_state.chat_agent_error = f"Failed to initialize chat agent: {str(e)}\n\nDetails: {error_details[:500]}"
+    thread = threading.Thread(target=_prewarm, daemon=True)
+    add_script_run_ctx(thread, get_script_run_ctx())
+    thread.start()
+
+
+def _prewarm():
+    init_chat_state()
+    chat_agent = st.session_state.get("chat_agent")
+    if chat_agent is not None:
+        try:
+            # Run the encoder once so the first real query pays no warm-up cost
+            chat_agent.embeddings.embed_query("warmup")
+        except Exception:
+            pass
+
+    # Compile the similarity kernel off the critical path
+    from utils.similarity import warm_up
+
+    warm_up()
 
 
 def check_rate_limit():
@@ -60,8 +114,8 @@ def generate_analysis(data, system_prompt, check_only=False, session_id=None):
 
 
 def get_chat_response(query, context_text, chat_history):
-    """Generate chat response using RAG."""
-    init_analysis_state()
+    """Generate chat response using RAG, yielding text as it is produced."""
+    init_chat_state()
 
     # Check if chat agent was successfully initialized
     if st.session_state.chat_agent is None:
@@ -69,31 +123,17 @@ def get_chat_response(query, context_text, chat_history):
             "chat_agent_error",
             "Chat functionality is currently unavailable. Please check your GROQ_API_KEY configuration in .streamlit/secrets.toml",
         )
-        return f"Error: {error_msg}"
+        yield f"Error: {error_msg}"
+        return
 
-    # Handle empty context - try to extract from chat history if available
+    # Handle empty context - fall back to the analysis in chat history
     if not context_text and chat_history:
-        # First, try to find the stored report text in system messages
-        for msg in chat_history:
-            if msg.get("role") == "system" and "__REPORT_TEXT__" in msg.get(
-                "content", ""
-            ):
-                # Extract report text from system message
-                content = msg.get("content", "")
-                start_idx = content.find("__REPORT_TEXT__\n") + len("__REPORT_TEXT__\n")
-                end_idx = content.find("\n__END_REPORT_TEXT__")
-                if start_idx > len("__REPORT_TEXT__\n") - 1 and end_idx > start_idx:
-                    context_text = content[start_idx:end_idx]
-                    break
-
-        # If still no context, try to extract from the first analysis message
-        if not context_text:
-            for msg in reversed(chat_history):
-                if msg["role"] == "assistant" and len(msg.get("content", "")) > 100:
-                    # This might be the analysis - use it as partial context
-                    # But we'll still work without vector store if needed
-                    context_text = msg["content"][:5000]  # Limit context size
-                    break
+        for msg in reversed(chat_history):
+            if msg["role"] == "assistant" and len(msg.get("content", "")) > 100:
+                # This might be the analysis - use it as partial context
+                # But we'll still work without vector store if needed
+                context_text = msg["content"][:5000]  # Limit context size
+                break
 
     # We need to persist/retrieve the vector store.
     # Since FAISS is in-memory, we can rebuild it for the session context or cache it.
@@ -105,15 +145,28 @@ def get_chat_response(query, context_text, chat_history):
         # Create a dummy vector store with minimal content to avoid errors
         context_text = "No report context available. Relying on chat history only."
 
-    if "vector_store" not in st.session_state or st.session_state.get(
-        "vector_store_key"
-    ) != len(context_text):
+    # Key vector stores by content so different reports never share one
+    context_key = hashlib.sha1(context_text.encode()).hexdigest()
+    if "vector_store_cache" not in st.session_state:
+        st.session_state.vector_store_cache = OrderedDict()
+    vector_store_cache = st.session_state.vector_store_cache
+
+    if context_key in vector_store_cache:
+        vector_store_cache.move_to_end(context_key)
+        st.session_state.vector_store = vector_store_cache[context_key]
+        st.session_state.vector_store_key = context_key
+    else:
         try:
             with st.spinner("Processing context..."):
                 st.session_state.vector_store = (
-                    st.session_state.chat_agent.initialize_vector_store(context_text)
+                    st.session_state.chat_agent.initialize_vector_store(
+                        context_text, cache_key=context_key
+                    )
                 )
-                st.session_state.vector_store_key = len(context_text)
+                st.session_state.vector_store_key = context_key
+                vector_store_cache[context_key] = st.session_state.vector_store
+                while len(vector_store_cache) > VECTOR_STORE_CACHE_SIZE:
+                    vector_store_cache.popitem(last=False)
         except Exception as e:
             # If vector store creation fails, create a minimal one
             st.warning(
@@ -125,11 +178,47 @@ def get_chat_response(query, context_text, chat_history):
                         "No report context available."
                     )
                 )
-                st.session_state.vector_store_key = 0
+                st.session_state.vector_store_key = None
             except Exception:
                 # Last resort - return error
-                return f"Error: Could not initialize vector store. {str(e)}"
+                yield f"Error: Could not initialize vector store. {str(e)}"
+                return
 
-    return st.session_state.chat_agent.get_response(
-        query, st.session_state.vector_store, chat_history
-    )
+    # Serve near-duplicate questions about the same report from the cache
+    if "semantic_cache" not in st.session_state:
+        from services.semantic_cache import SemanticCache
+
+        st.session_state.semantic_cache = SemanticCache(
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+            max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+        )
+    cache = st.session_state.semantic_cache
+    context_key = st.session_state.get("vector_store_key")
+
+    # Follow-ups like "is that normal?" depend on the previous turn, so the
+    # same words can need a different answer; never serve or store them
+    query_embedding = None
+    if not st.session_state.chat_agent.is_follow_up(query):
+        try:
+            query_embedding = st.session_state.chat_agent.embeddings.embed_query(query)
+            cached_response = cache.lookup(query_embedding, context_key)
+            if cached_response is not None:
+                yield cached_response
+                return
+        except Exception:
+            query_embedding = None
+
+    parts = []
+    for part in st.session_state.chat_agent.get_response(
+        query,
+        st.session_state.vector_store,
+        chat_history,
+        query_embedding=query_embedding,
+    ):
+        parts.append(part)
+        yield part
+    response = "".join(parts)
+
+    if query_embedding is not None and "Error generating response" not in response:
+        cache.add(query_embedding, response, context_key)
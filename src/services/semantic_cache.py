@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+import numpy as np
+import faiss
+from utils.similarity import SMALL_CORPUS_SIZE, top_k_cosine
+
+
+class SemanticCache:
+    """
+    Caches chat answers keyed by the embedding of the user's query so that
+    near-duplicate questions about the same report skip the Groq round-trips.
+    """
+
+    def __init__(self, threshold=0.92, ttl_seconds=300, max_entries=500):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.index = None
+        self.entries = OrderedDict()  # id -> (answer, timestamp, context_key)
+        self._next_id = 0
+        # Contiguous copy of the cached vectors for the small-cache path;
+        # rows [0, len(entries)) are live, _row_ids maps row -> entry id
+        self._matrix = None
+        self._row_ids = []
+        self._rows = {}  # entry id -> row
+
+    @staticmethod
+    def _as_query(embedding):
+        """Return a normalized (1, d) float32 array for FAISS."""
+        vector = np.asarray(embedding, dtype="float32").reshape(1, -1).copy()
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _remove(self, entry_id):
+        self.entries.pop(entry_id, None)
+        self.index.remove_ids(np.asarray([entry_id], dtype="int64"))
+
+        # Fill the freed row with the last one to keep the live rows packed
+        row = self._rows.pop(entry_id)
+        last_id = self._row_ids.pop()
+        if last_id != entry_id:
+            self._matrix[row] = self._matrix[len(self._row_ids)]
+            self._row_ids[row] = last_id
+            self._rows[last_id] = row
+
+    def lookup(self, embedding, context_key):
+        """Return a cached answer for a similar query on the same context, if any."""
+        if self.index is None or self.index.ntotal == 0:
+            return None
+
+        query = self._as_query(embedding)
+        k = min(self.index.ntotal, 8)
+        if len(self.entries) <= SMALL_CORPUS_SIZE:
+            # A direct dot product beats a FAISS call for a handful of entries
+            matrix = self._matrix[: len(self._row_ids)]
+            scores, rows = top_k_cosine(query[0], matrix, k)
+            ids = [self._row_ids[row] for row in rows]
+        else:
+            scores, ids = self.index.search(query, k)
+            scores, ids = scores[0], ids[0]
+
+        now = time.time()
+        for score, entry_id in zip(scores, ids):
+            if entry_id < 0 or score < self.threshold:
+                break
+            entry = self.entries.get(int(entry_id))
+            if entry is None:
+                continue
+            answer, timestamp, entry_context = entry
+            if now - timestamp >= self.ttl_seconds:
+                self._remove(int(entry_id))
+                continue
+            if entry_context != context_key:
+                continue
+            self.entries.move_to_end(int(entry_id))
+            return answer
+        return None
+
+    def add(self, embedding, answer, context_key):
+        """Store an answer, evicting the least recently used entries if full."""
+        vector = self._as_query(embedding)
+        if self.index is None:
+            self.index = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+            self._matrix = np.empty((self.max_entries, vector.shape[1]), dtype="float32")
+
+        while len(self.entries) >= self.max_entries:
+            oldest_id = next(iter(self.entries))
+            self._remove(oldest_id)
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(vector, np.asarray([entry_id], dtype="int64"))
+        self.entries[entry_id] = (answer, time.time(), context_key)
+        self._rows[entry_id] = len(self._row_ids)
+        self._matrix[len(self._row_ids)] = vector[0]
+        self._row_ids.append(entry_id)
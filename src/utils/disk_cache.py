@@ -0,0 +1,47 @@
+import os
+import time
+
+
+def touch(path):
+    """Mark a cache file as recently used so eviction keeps it."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache_dir(cache_dir, max_bytes, max_age_seconds):
+    """Delete expired files, then least recently used ones until under max_bytes."""
+    try:
+        entries = []
+        with os.scandir(cache_dir) as scan:
+            for entry in scan:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+
+    cutoff = time.time() - max_age_seconds
+    total = 0
+    kept = []
+    for mtime, size, path in entries:
+        if mtime < cutoff:
+            _remove(path)
+        else:
+            kept.append((mtime, size, path))
+            total += size
+
+    kept.sort()  # Oldest first
+    for _, size, path in kept:
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,63 @@
+import numpy as np
+
+# Below this many vectors a compiled dot-product loop beats building and
+# querying a FAISS index
+SMALL_CORPUS_SIZE = 32
+
+_kernel = None
+_warmed = False
+
+
+def _cosine_scores_numpy(query, matrix):
+    return matrix @ query
+
+
+def _cosine_scores_loop(query, matrix):
+    n, d = matrix.shape
+    scores = np.empty(n, dtype=np.float32)
+    for i in range(n):
+        acc = np.float32(0.0)
+        for j in range(d):
+            acc += matrix[i, j] * query[j]
+        scores[i] = acc
+    return scores
+
+
+def _get_kernel():
+    """Compile the scoring loop with numba on first use; numpy if unavailable."""
+    global _kernel
+    if _kernel is None:
+        try:
+            from numba import njit
+
+            _kernel = njit(cache=True, fastmath=True)(_cosine_scores_loop)
+        except ImportError:  # numba is optional
+            _kernel = _cosine_scores_numpy
+    return _kernel
+
+
+def top_k_cosine(query, matrix, k):
+    """Return (scores, indices) of the k rows of matrix most similar to query.
+
+    Both inputs must already be L2-normalized, so the dot product is the
+    cosine similarity.
+    """
+    query = np.ascontiguousarray(query, dtype=np.float32).reshape(-1)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    scores = _get_kernel()(query, matrix)
+
+    k = min(k, len(scores))
+    if k <= 0:
+        return scores[:0], np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return scores[top], top
+
+
+def warm_up():
+    """Compile the numba kernel ahead of the first real query, once per process."""
+    global _warmed
+    if _warmed:
+        return
+    _warmed = True
+    top_k_cosine(np.ones(384, dtype=np.float32), np.ones((2, 384), dtype=np.float32), 1)
@@ -0,0 +1,45 @@
+import re
+from bisect import bisect_left, bisect_right
+
+# Paragraph breaks and whitespace following sentence-ending punctuation
+_SEP_RE = re.compile(r"\n\n+|(?<=[.!?])\s+")
+
+
+def split_text(text, chunk_size=1000, chunk_overlap=200):
+    """Split text into overlapping chunks at paragraph and sentence boundaries."""
+    text_len = len(text)
+    if text_len <= chunk_size:
+        stripped = text.strip()
+        return [stripped] if stripped else []
+
+    # Offsets where a new sentence or paragraph starts, found in one C-level scan
+    breaks = [match.end() for match in _SEP_RE.finditer(text)]
+    breaks.append(text_len)
+
+    chunks = []
+    start = 0
+    while start < text_len:
+        # Pack as many whole segments as fit; hard-cut oversized segments
+        i = bisect_right(breaks, start + chunk_size) - 1
+        if i >= 0 and breaks[i] > start:
+            end = breaks[i]
+            hard_cut = False
+        else:
+            end = min(start + chunk_size, text_len)
+            hard_cut = True
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= text_len:
+            break
+
+        # Start the next chunk at the first boundary inside the overlap window
+        if hard_cut:
+            next_start = end - chunk_overlap
+        else:
+            j = bisect_left(breaks, end - chunk_overlap)
+            next_start = breaks[j] if breaks[j] < end else end
+        start = next_start if next_start > start else end
+
+    return chunks